@@ -5,26 +5,59 @@
 On-chain code marketplace with ERC-8004 agent identity.
 Connects to PawnShop contract on Base.
 
-Run: uvicorn main:app --port 8005
+Run: gunicorn main:app -k uvicorn.workers.UvicornWorker -w ${WEB_CONCURRENCY:-4} -b 0.0.0.0:8005 --preload
+Dev: uvicorn main:app --port 8005
 """
 
 import os
 import json
-import hashlib
-from typing import Optional
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import NamedTuple, Optional
 from pathlib import Path
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, constr
 from web3 import Web3
 from eth_account import Account
-import requests
+from eth_hash.auto import keccak  # backend follows ETH_HASH_BACKEND if set
+from cachetools import LRUCache, TTLCache
+import httpx
+import orjson
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+try:
+    import h2  # noqa: F401 - lets httpx negotiate HTTP/2
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+try:
+    import numpy as np
+    from numba import njit
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    _NUMBA_AVAILABLE = False
 
 # =============================================================================
 # CONFIG
 # =============================================================================
 
+log = logging.getLogger("uvicorn.error")  # shows up under uvicorn and gunicorn
+
+# Server
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "4"))  # worker processes
+
 # Network
 RPC_URL = os.environ.get("BASE_RPC_URL", "https://base.llamarpc.com")
 CHAIN_ID = 8453  # Base mainnet
@@ -34,11 +67,44 @@ PAWN_SHOP_ADDRESS = os.environ.get("PAWN_SHOP_ADDRESS", "")
 RECYCLE_TOKEN_ADDRESS = os.environ.get("RECYCLE_TOKEN_ADDRESS", "")
 IDENTITY_REGISTRY_ADDRESS = os.environ.get("IDENTITY_REGISTRY_ADDRESS", "")
 
+# Outbound HTTP (RPC, Pinata, IPFS gateway) shares one pooled client
+HTTP_TIMEOUT = 10  # seconds
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=128, keepalive_expiry=60)
+
+# Request limits (hashing, scoring and upload all scale with code size)
+MIN_CODE_LENGTH = 50  # chars
+MAX_CODE_LENGTH = 1_048_576  # chars
+# Worst-case JSON for max-length code: every char a \uXXXX surrogate pair
+# (12 bytes), plus headroom for the other fields
+MAX_BODY_BYTES = 12 * MAX_CODE_LENGTH + 64 * 1024
+
+# Transactions
+TX_GAS_LIMIT = 300000
+PRIORITY_FEE_PERCENTILE = 50  # of the latest block's tips, via eth_feeHistory
+NONCE_CACHE_TTL = 60  # seconds a sender's local nonce counter is kept
+
+# Multicall3 (same address on every EVM chain, including Base)
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
 # IPFS
-IPFS_GATEWAY = "https://gateway.pinata.cloud/ipfs/"
+# Reads race every gateway and take the first good response; latency varies
+# per gateway and per CID, so the fastest one changes from fetch to fetch
+IPFS_GATEWAYS = os.environ.get(
+    "IPFS_GATEWAYS",
+    "https://gateway.pinata.cloud/ipfs/,https://ipfs.io/ipfs/,https://dweb.link/ipfs/"
+).split(",")
+IPFS_GATEWAY_TIMEOUT = 1.5  # seconds, per gateway
 PINATA_API_KEY = os.environ.get("PINATA_API_KEY", "")
 PINATA_SECRET = os.environ.get("PINATA_SECRET", "")
 
+# Caches (view results go stale after a block or two; IPFS content never does)
+VIEW_CACHE_TTL = 15  # seconds
+DEPOSIT_CACHE_TTL = 600  # seconds; repeat deposits skip the re-upload
+STATS_REFRESH_INTERVAL = 2  # seconds, about one Base block
+FEES_REFRESH_INTERVAL = 3  # seconds
+IPFS_CACHE_SIZE = 64 * 1024 * 1024  # chars of fetched code held in memory
+IPFS_CACHE_DIR = os.environ.get("IPFS_CACHE_DIR", "")  # optional disk tier
+
 # ABIs (simplified - load full ABIs in production)
 PAWN_SHOP_ABI = [
     {
@@ -117,76 +183,369 @@ ERC20_ABI = [
     }
 ]
 
+# =============================================================================
+# CACHE
+# =============================================================================
+# Caches are per worker process; nothing here needs to be shared.
+
+# (contract address, calldata) -> decoded view result
+view_cache = TTLCache(maxsize=10_000, ttl=VIEW_CACHE_TTL)
+
+# CID -> code (content-addressed, so no expiry); bounded by total size
+ipfs_cache = LRUCache(maxsize=IPFS_CACHE_SIZE, getsizeof=len)
+
+# CID -> gateway that won the last race for it
+ipfs_gateway_cache = LRUCache(maxsize=1024)
+
+# keccak256(code) -> ipfs_uri
+deposit_cache = TTLCache(maxsize=4096, ttl=DEPOSIT_CACHE_TTL)
+ipfs_disk_cache = diskcache.Cache(IPFS_CACHE_DIR) if IPFS_CACHE_DIR and diskcache else None
+
+_inflight: dict = {}
+
+@asynccontextmanager
+async def single_flight(key):
+    """Serialize cache fills per key so concurrent misses fetch only once."""
+    lock = _inflight.setdefault(key, asyncio.Lock())
+    try:
+        async with lock:
+            yield
+    finally:
+        if _inflight.get(key) is lock:
+            del _inflight[key]
+
+def invalidate_views(*calls):
+    """Drop cached results for the given encoded calls."""
+    for target, calldata, _ in calls:
+        view_cache.pop((target, calldata), None)
+
 # =============================================================================
 # WEB3 CLIENT
 # =============================================================================
 
 w3 = Web3(Web3.HTTPProvider(RPC_URL))
 
-def get_pawn_shop():
-    if not PAWN_SHOP_ADDRESS:
+# Shared, pooled async HTTP client for RPC, Pinata and IPFS (created on
+# startup) so TLS handshakes are paid once per host, not once per request
+http_client: Optional[httpx.AsyncClient] = None
+
+def get_pawn_shop(request: Request):
+    """Dependency: PawnShop contract built on startup."""
+    if request.app.state.pawn_shop is None:
         raise HTTPException(500, "PawnShop contract not configured")
-    return w3.eth.contract(address=PAWN_SHOP_ADDRESS, abi=PAWN_SHOP_ABI)
+    return request.app.state.pawn_shop
 
-def get_recycle_token():
-    if not RECYCLE_TOKEN_ADDRESS:
+def get_recycle_token(request: Request):
+    """Dependency: $RECYCLE token contract built on startup."""
+    if request.app.state.recycle_token is None:
         raise HTTPException(500, "RECYCLE token not configured")
-    return w3.eth.contract(address=RECYCLE_TOKEN_ADDRESS, abi=ERC20_ABI)
+    return request.app.state.recycle_token
+
+def function_spec(abi: list, fn_name: str) -> tuple:
+    """(selector, input types, output types) for an ABI function."""
+    fn_abi = next(f for f in abi if f.get("name") == fn_name)
+    input_types = [i["type"] for i in fn_abi["inputs"]]
+    output_types = [o["type"] for o in fn_abi["outputs"]]
+    selector = Web3.keccak(text=f"{fn_name}({','.join(input_types)})")[:4]
+    return selector, input_types, output_types
+
+# Selectors and types resolved once, instead of per call via encodeABI
+DEPOSIT = function_spec(PAWN_SHOP_ABI, "deposit")
+PURCHASE = function_spec(PAWN_SHOP_ABI, "purchase")
+GET_PATTERN = function_spec(PAWN_SHOP_ABI, "getPattern")
+HAS_ACCESS = function_spec(PAWN_SHOP_ABI, "hasAccess")
+STATS = function_spec(PAWN_SHOP_ABI, "stats")
+BALANCE_OF = function_spec(ERC20_ABI, "balanceOf")
+
+# aggregate3((address target, bool allowFailure, bytes callData)[])
+AGGREGATE3_SELECTOR = Web3.keccak(text="aggregate3((address,bool,bytes)[])")[:4]
+
+def encode_calldata(fn: tuple, args: list = ()) -> str:
+    """ABI-encode a function call from its precomputed spec."""
+    selector, input_types, _ = fn
+    return "0x" + (selector + w3.codec.encode(input_types, list(args))).hex()
+
+def encode_call(contract, fn: tuple, args: list = ()) -> tuple:
+    """Encode a view call as (target, calldata, output types) for batching."""
+    return contract.address, encode_calldata(fn, args), fn[2]
+
+async def rpc_batch(calls: list) -> list:
+    """Send several JSON-RPC requests to the node in one HTTP round-trip."""
+    payload = [
+        {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+        for i, (method, params) in enumerate(calls)
+    ]
+    r = await http_client.post(
+        RPC_URL, content=orjson.dumps(payload), headers={"content-type": "application/json"}
+    )
+    if r.status_code != 200:
+        raise HTTPException(502, f"RPC request failed: {r.text}")
 
-def hash_code(code: str) -> bytes:
-    """Generate keccak256 hash of code."""
-    return w3.keccak(text=code)
+    try:
+        body = orjson.loads(r.content)
+    except orjson.JSONDecodeError:
+        body = None
+    if not isinstance(body, list):  # e.g. one error object from a node that rejects batches
+        error = body.get("error", body) if isinstance(body, dict) else r.text
+        raise HTTPException(502, f"RPC error: {error}")
+    responses = {resp.get("id"): resp for resp in body if isinstance(resp, dict)}
+    results = []
+    for i in range(len(calls)):
+        resp = responses.get(i, {})
+        if "result" not in resp:
+            raise HTTPException(502, f"RPC error: {resp.get('error', 'no response')}")
+        results.append(resp["result"])
+    return results
+
+def eth_call(target: str, calldata: str) -> tuple:
+    """JSON-RPC (method, params) pair for an eth_call against latest."""
+    return "eth_call", [{"to": target, "data": calldata}, "latest"]
+
+async def read_views(calls: list) -> list:
+    """Run view calls, serving cached results and batching the misses."""
+    keys = [(target, calldata) for target, calldata, _ in calls]
+    results = {key: view_cache.get(key) for key in keys}
+    missing = [i for i, key in enumerate(keys) if results[key] is None]
+
+    if missing:
+        async with single_flight(tuple(keys[i] for i in missing)):
+            # Another request may have filled these while we waited
+            for i in missing:
+                results[keys[i]] = view_cache.get(keys[i])
+            missing = [i for i in missing if results[keys[i]] is None]
+            if missing:
+                fetched = await fetch_views([calls[i] for i in missing])
+                for i, result in zip(missing, fetched):
+                    results[keys[i]] = view_cache[keys[i]] = result
+
+    return [results[key] for key in keys]
+
+async def fetch_views(calls: list) -> list:
+    """Run view calls in a single eth_call, via Multicall3 when batching."""
+    if len(calls) == 1:
+        target, calldata, output_types = calls[0]
+        (raw,) = await rpc_batch([eth_call(target, calldata)])
+        return [w3.codec.decode(output_types, Web3.to_bytes(hexstr=raw))]
+
+    aggregate = AGGREGATE3_SELECTOR + w3.codec.encode(
+        ["(address,bool,bytes)[]"],
+        [[(target, False, Web3.to_bytes(hexstr=calldata)) for target, calldata, _ in calls]]
+    )
+    (raw,) = await rpc_batch([eth_call(MULTICALL3_ADDRESS, "0x" + aggregate.hex())])
+    (results,) = w3.codec.decode(["(bool,bytes)[]"], Web3.to_bytes(hexstr=raw))
+
+    return [
+        w3.codec.decode(output_types, return_data)
+        for (_, _, output_types), (_, return_data) in zip(calls, results)
+    ]
+
+def parse_code_hash(code_hash: str) -> bytes:
+    """Parse a 0x-prefixed (or bare) 32-byte hex hash, 400 on bad input."""
+    digits = code_hash[2:] if code_hash.startswith(("0x", "0X")) else code_hash
+    if len(digits) != 64:
+        raise HTTPException(400, "Code hash must be 32 bytes of hex")
+    try:
+        value = bytes.fromhex(digits)
+    except ValueError:
+        raise HTTPException(400, "Code hash is not valid hex")
+    if len(value) != 32:  # fromhex skips whitespace
+        raise HTTPException(400, "Code hash is not valid hex")
+    return value
+
+FEE_HISTORY = ("eth_feeHistory", [1, "latest", [PRIORITY_FEE_PERCENTILE]])
+
+def parse_fees(fee_history: dict) -> tuple:
+    """(maxFeePerGas, maxPriorityFeePerGas) from an eth_feeHistory result."""
+    base_fee = int(fee_history["baseFeePerGas"][-1], 16)  # next block
+    priority_fee = int(fee_history["reward"][-1][0], 16)
+    return 2 * base_fee + priority_fee, priority_fee
+
+async def fetch_fees() -> tuple:
+    """(maxFeePerGas, maxPriorityFeePerGas) from the latest fee history."""
+    (fee_history,) = await rpc_batch([FEE_HISTORY])
+    return parse_fees(fee_history)
+
+class NonceManager:
+    """Hands out nonces per sender that are safe across workers.
+
+    Every nonce starts from eth_getTransactionCount (pending), so sends
+    from other worker processes are seen. A local counter covers this
+    worker's own sends that haven't reached the node's pool yet.
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._nonces = TTLCache(maxsize=10_000, ttl=NONCE_CACHE_TTL)
+
+    async def next(self, address: str, pending: Optional[int] = None) -> int:
+        """Next nonce; pass pending if it was already fetched in a batch."""
+        if pending is None:
+            (count,) = await rpc_batch([pending_nonce(address)])
+            pending = int(count, 16)
+        async with self._lock:
+            nonce = max(pending, self._nonces.get(address, 0))
+            self._nonces[address] = nonce + 1
+            return nonce
+
+    async def reset(self, address: str):
+        async with self._lock:
+            self._nonces.pop(address, None)
+
+nonce_manager = NonceManager()
+
+def pending_nonce(address: str) -> tuple:
+    """JSON-RPC (method, params) pair for an address's pending tx count."""
+    return "eth_getTransactionCount", [address, "pending"]
+
+def build_tx(contract, fn: tuple, args: list, nonce: int, fees: tuple) -> dict:
+    """Build a signed-ready EIP-1559 transaction without any RPC calls."""
+    max_fee, priority_fee = fees
+    return {
+        "to": contract.address,
+        "data": encode_calldata(fn, args),
+        "value": 0,
+        "chainId": CHAIN_ID,
+        "gas": TX_GAS_LIMIT,
+        "nonce": nonce,
+        "maxFeePerGas": max_fee,
+        "maxPriorityFeePerGas": priority_fee,
+    }
 
-def sign_and_send(tx: dict, private_key: str) -> str:
+async def sign_and_send(tx: dict, private_key: str) -> str:
     """Sign and send transaction."""
     account = Account.from_key(private_key)
-    tx['from'] = account.address
-    tx['nonce'] = w3.eth.get_transaction_count(account.address)
-    tx['gas'] = 300000
-    tx['gasPrice'] = w3.eth.gas_price
-
     signed = account.sign_transaction(tx)
-    tx_hash = w3.eth.send_raw_transaction(signed.rawTransaction)
-    return tx_hash.hex()
+    try:
+        (tx_hash,) = await rpc_batch([
+            ("eth_sendRawTransaction", [Web3.to_hex(signed.rawTransaction)])
+        ])
+    except HTTPException as e:
+        # This exact transaction is already in the pool: the send succeeded
+        if "already known" not in str(e.detail).lower():
+            raise
+        tx_hash = Web3.to_hex(keccak(signed.rawTransaction))
+    return tx_hash
+
+# Node errors meaning another send (usually from another worker) already
+# took this nonce
+NONCE_ERRORS = ("nonce too low", "replacement transaction underpriced")
+
+async def send_transaction(contract, fn: tuple, args: list, private_key: str, fees: tuple,
+                           pending: Optional[int] = None) -> str:
+    """Build, sign and send a transaction with a fresh nonce.
+
+    If the nonce was taken in the meantime, resync from the chain and
+    retry once.
+    """
+    address = Account.from_key(private_key).address
+    for attempt in range(2):
+        nonce = await nonce_manager.next(address, None if attempt else pending)
+        tx = build_tx(contract, fn, args, nonce, fees)
+        try:
+            return await sign_and_send(tx, private_key)
+        except Exception as e:
+            await nonce_manager.reset(address)
+            detail = str(getattr(e, "detail", "")).lower()
+            if attempt or not any(err in detail for err in NONCE_ERRORS):
+                raise
 
 # =============================================================================
 # IPFS CLIENT
 # =============================================================================
 
-def upload_to_ipfs(content: str) -> str:
+async def upload_to_ipfs(content: str, code_hash: bytes) -> str:
     """Upload content to IPFS via Pinata."""
     if not PINATA_API_KEY:
-        # Fallback: return hash as mock URI
-        content_hash = hashlib.sha256(content.encode()).hexdigest()[:16]
-        return f"ipfs://mock/{content_hash}"
+        # Fallback: mock URI from the keccak digest we already computed
+        return f"ipfs://mock/{code_hash[:8].hex()}"
 
     url = "https://api.pinata.cloud/pinning/pinJSONToIPFS"
     headers = {
         "pinata_api_key": PINATA_API_KEY,
-        "pinata_secret_api_key": PINATA_SECRET
+        "pinata_secret_api_key": PINATA_SECRET,
+        "content-type": "application/json"
     }
     data = {
         "pinataContent": {"code": content},
         "pinataMetadata": {"name": "pawnshop-pattern"}
     }
 
-    r = requests.post(url, json=data, headers=headers)
+    r = await http_client.post(url, content=orjson.dumps(data), headers=headers)
     if r.status_code == 200:
-        ipfs_hash = r.json()["IpfsHash"]
+        ipfs_hash = orjson.loads(r.content)["IpfsHash"]
         return f"ipfs://{ipfs_hash}"
     else:
         raise HTTPException(500, f"IPFS upload failed: {r.text}")
 
-def fetch_from_ipfs(uri: str) -> str:
-    """Fetch content from IPFS."""
+async def upload_once(content: str, code_hash: bytes) -> str:
+    """Upload to IPFS unless this exact code was uploaded recently.
+
+    IPFS URIs are content-addressed, so a cached URI is always valid.
+    """
+    ipfs_uri = deposit_cache.get(code_hash)
+    if ipfs_uri is None:
+        ipfs_uri = deposit_cache[code_hash] = await upload_to_ipfs(content, code_hash)
+    return ipfs_uri
+
+async def fetch_from_ipfs(uri: str) -> str:
+    """Fetch content from IPFS, memory cache first, then disk, then gateway."""
     if uri.startswith("ipfs://mock/"):
         raise HTTPException(404, "Mock IPFS content not available")
 
     ipfs_hash = uri.replace("ipfs://", "")
-    url = f"{IPFS_GATEWAY}{ipfs_hash}"
-    r = requests.get(url)
+    code = ipfs_cache.get(ipfs_hash)
+    if code is not None:
+        return code
+
+    async with single_flight(ipfs_hash):
+        code = ipfs_cache.get(ipfs_hash)
+        if code is None and ipfs_disk_cache is not None:
+            code = await run_in_threadpool(ipfs_disk_cache.get, ipfs_hash)
+        if code is None:
+            code = await fetch_from_gateway(ipfs_hash)
+            if ipfs_disk_cache is not None:
+                await run_in_threadpool(ipfs_disk_cache.set, ipfs_hash, code)
+        if len(code) <= ipfs_cache.maxsize:
+            ipfs_cache[ipfs_hash] = code
+
+    return code
+
+async def fetch_from_gateway(ipfs_hash: str) -> str:
+    """Fetch content from the fastest IPFS gateway.
+
+    Tries the last winner for this CID first, then races all gateways and
+    cancels the rest once one returns the content.
+    """
+    preferred = ipfs_gateway_cache.get(ipfs_hash)
+    if preferred is not None:
+        try:
+            return await fetch_from_single_gateway(preferred, ipfs_hash)
+        except Exception:
+            pass
+
+    tasks = {
+        asyncio.create_task(fetch_from_single_gateway(gateway, ipfs_hash)): gateway
+        for gateway in IPFS_GATEWAYS
+    }
+    try:
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                gateway = tasks.pop(task)
+                if task.exception() is None:
+                    ipfs_gateway_cache[ipfs_hash] = gateway
+                    return task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    raise HTTPException(404, "IPFS content not found")
+
+async def fetch_from_single_gateway(gateway: str, ipfs_hash: str) -> str:
+    """Fetch content from one IPFS gateway."""
+    r = await http_client.get(f"{gateway}{ipfs_hash}", timeout=IPFS_GATEWAY_TIMEOUT)
     if r.status_code == 200:
-        return r.json().get("code", "")
+        return orjson.loads(r.content).get("code", "")
     else:
         raise HTTPException(404, "IPFS content not found")
 
@@ -194,12 +553,154 @@ def fetch_from_ipfs(uri: str) -> str:
 # QUALITY SCORING (same as token-recycler)
 # =============================================================================
 
+# Substrings scored as "has structure" and "has comments"
+STRUCTURE_PATTERNS = [b"def ", b"class ", b"function "]
+COMMENT_PATTERNS = [b"#", b"//", b'"""']
+LONG_LINE = 120  # chars
+SCAN_CHUNK_SIZE = 32 * 1024  # chars; keeps each chunk's bytes in L2
+
+def build_pattern_dfa(groups: list) -> tuple:
+    """Compile pattern groups into a dense Aho-Corasick DFA.
+
+    Returns (transitions[state][byte], flags[state]); group i sets bit
+    1 << i in the flags of every state where one of its patterns ends.
+    """
+    goto = [{}]
+    flags = [0]
+    for bit, patterns in enumerate(groups):
+        for pattern in patterns:
+            state = 0
+            for byte in pattern:
+                if byte not in goto[state]:
+                    goto.append({})
+                    flags.append(0)
+                    goto[state][byte] = len(goto) - 1
+                state = goto[state][byte]
+            flags[state] |= 1 << bit
+
+    # Breadth-first, so a state's failure target is always finished first
+    transitions = [[0] * 256 for _ in goto]
+    fail = [0] * len(goto)
+    queue = deque(goto[0].values())
+    transitions[0] = [goto[0].get(byte, 0) for byte in range(256)]
+    while queue:
+        state = queue.popleft()
+        flags[state] |= flags[fail[state]]
+        for byte in range(256):
+            nxt = goto[state].get(byte)
+            if nxt is None:
+                transitions[state][byte] = transitions[fail[state]][byte]
+            else:
+                fail[nxt] = transitions[fail[state]][byte]
+                transitions[state][byte] = nxt
+                queue.append(nxt)
+
+    return transitions, flags
+
+# Fallback scan: str patterns, plus enough of the previous chunk to catch
+# a pattern split across the chunk boundary
+_TEXT_PATTERN_GROUPS = [
+    [p.decode() for p in STRUCTURE_PATTERNS],
+    [p.decode() for p in COMMENT_PATTERNS],
+]
+_PATTERN_OVERLAP = max(len(p) for p in STRUCTURE_PATTERNS + COMMENT_PATTERNS) - 1
+_ALL_FLAGS = 0b11
+
+if _NUMBA_AVAILABLE:
+    _transitions, _state_flags = build_pattern_dfa([STRUCTURE_PATTERNS, COMMENT_PATTERNS])
+    _DFA_TRANSITIONS = np.array(_transitions, dtype=np.int32)
+    _DFA_FLAGS = np.array(_state_flags, dtype=np.uint8)
+
+    @njit(cache=True)
+    def _quality_scan(buf, transitions, state_flags, all_flags, long_line,
+                      state, flags, newlines, long_lines, line_len):
+        """Advance the scan state over one chunk of UTF-8 bytes."""
+        for i in range(buf.shape[0]):
+            b = buf[i]
+            if b == 10:  # \n
+                newlines += 1
+                if line_len > long_line:
+                    long_lines += 1
+                line_len = 0
+            elif (b & 0xC0) != 0x80:  # count chars, not continuation bytes
+                line_len += 1
+
+            if flags != all_flags:
+                state = transitions[state, b]
+                flags |= state_flags[state]
+
+        return state, flags, newlines, long_lines, line_len
+
+class QualityScanner:
+    """Incremental quality scan, fed one chunk of code at a time.
+
+    Carries line stats and pattern flags across chunks, so code can be
+    hashed and scored together in one pass of L2-sized chunks.
+    """
+
+    def __init__(self):
+        self.state = 0  # DFA state
+        self.flags = 0
+        self.newlines = 0
+        self.long_lines = 0
+        self.line_len = 0  # chars in the still-open last line
+        self.tail = ""  # end of the previous chunk (fallback only)
+
+    def feed(self, text: str, data: bytes):
+        """Scan one chunk; data is text encoded as UTF-8."""
+        if _NUMBA_AVAILABLE:
+            self.state, self.flags, self.newlines, self.long_lines, self.line_len = _quality_scan(
+                np.frombuffer(data, dtype=np.uint8), _DFA_TRANSITIONS, _DFA_FLAGS,
+                _ALL_FLAGS, LONG_LINE, self.state, self.flags, self.newlines,
+                self.long_lines, self.line_len
+            )
+            return
+
+        lines = text.split('\n')
+        self.line_len += len(lines[0])
+        if len(lines) > 1:
+            self.newlines += len(lines) - 1
+            if self.line_len > LONG_LINE:
+                self.long_lines += 1
+            self.long_lines += sum(1 for line in lines[1:-1] if len(line) > LONG_LINE)
+            self.line_len = len(lines[-1])
+
+        window = self.tail + text[:_PATTERN_OVERLAP]
+        for bit, patterns in enumerate(_TEXT_PATTERN_GROUPS):
+            if not self.flags & (1 << bit):
+                if any(p in text or p in window for p in patterns):
+                    self.flags |= 1 << bit
+        self.tail = (self.tail + text)[-_PATTERN_OVERLAP:]
+
+    def score(self) -> int:
+        long_lines = self.long_lines + (1 if self.line_len > LONG_LINE else 0)
+        return quality_score(
+            self.newlines + 1, long_lines, bool(self.flags & 1), bool(self.flags & 2)
+        )
+
+def iter_chunks(code: str):
+    """Yield (text, UTF-8 bytes) chunks of code, SCAN_CHUNK_SIZE chars each."""
+    for start in range(0, len(code), SCAN_CHUNK_SIZE):
+        text = code[start:start + SCAN_CHUNK_SIZE]
+        yield text, text.encode("utf-8")
+
+def warm_up_quality():
+    """Compile (or load the cached) quality kernel before serving traffic."""
+    if _NUMBA_AVAILABLE:
+        estimate_quality("def warm_up():\n    pass  # noqa\n")
+
 def estimate_quality(code: str) -> int:
     """Score code quality 10-100."""
+    scanner = QualityScanner()
+    for text, data in iter_chunks(code):
+        scanner.feed(text, data)
+    return scanner.score()
+
+def quality_score(lines: int, long_lines: int, has_structure: bool, has_comments: bool) -> int:
+    """Turn scan results into a 10-100 score."""
     scores = []
 
     # Length check
-    lines = code.count('\n') + 1
     if 10 <= lines <= 500:
         scores.append(100)
     elif lines < 10:
@@ -208,19 +709,18 @@ def estimate_quality(code: str) -> int:
         scores.append(70)
 
     # Has structure
-    if "def " in code or "class " in code or "function " in code:
+    if has_structure:
         scores.append(100)
     else:
         scores.append(60)
 
     # Has comments/docs
-    if "#" in code or "//" in code or '"""' in code:
+    if has_comments:
         scores.append(90)
     else:
         scores.append(70)
 
     # Line lengths
-    long_lines = sum(1 for line in code.split('\n') if len(line) > 120)
     if long_lines == 0:
         scores.append(100)
     elif long_lines < 5:
@@ -232,12 +732,43 @@ def estimate_quality(code: str) -> int:
     avg = sum(scores) / len(scores)
     return max(10, min(100, int(avg)))
 
+def digest_code(code: str) -> bytes:
+    """keccak256 of the code's UTF-8 bytes, hashed chunk by chunk."""
+    hasher = keccak.new(b"")
+    for _, data in iter_chunks(code):
+        hasher.update(data)
+    return hasher.digest()
+
+def digest_and_score(code: str) -> tuple:
+    """keccak256 and quality score in one chunked pass over the code."""
+    hasher = keccak.new(b"")
+    scanner = QualityScanner()
+    for text, data in iter_chunks(code):
+        hasher.update(data)
+        scanner.feed(text, data)
+    return hasher.digest(), scanner.score()
+
 # =============================================================================
 # MODELS
 # =============================================================================
 
+class Pattern(NamedTuple):
+    """PawnShop.getPattern() result, field order as in the ABI."""
+    ipfs_uri: str
+    seller: str
+    price: int
+    quality: int
+    times_sold: int
+    active: bool
+
+    @classmethod
+    def from_view(cls, result: tuple) -> "Pattern":
+        """Build from a raw getPattern() decode, checksumming the seller as web3 does."""
+        pattern = cls._make(result)
+        return pattern._replace(seller=Web3.to_checksum_address(pattern.seller))
+
 class DepositRequest(BaseModel):
-    code: str
+    code: constr(min_length=MIN_CODE_LENGTH, max_length=MAX_CODE_LENGTH)
     language: str = "python"
     private_key: Optional[str] = None  # For signing tx
 
@@ -254,10 +785,17 @@ class QueryRequest(BaseModel):
 # API
 # =============================================================================
 
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered straight to bytes by orjson."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
 app = FastAPI(
     title="8004 Pawn Shop",
     description="On-chain code marketplace with ERC-8004 agent identity",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -267,6 +805,80 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def limit_body_size(request: Request, call_next):
+    """Reject oversized bodies by Content-Length before they are read."""
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_BODY_BYTES:
+        return ORJSONResponse({"detail": "Request body too large"}, status_code=413)
+    return await call_next(request)
+
+async def keep_fresh(name: str, fetch, interval: float):
+    """Refresh app.state.<name> in the background so requests never wait on it."""
+    failing = False
+    while True:
+        try:
+            setattr(app.state, name, await fetch())
+            app.state.refreshed_at[name] = time.monotonic()
+            if failing:
+                log.info("Refreshing %s recovered", name)
+            failing = False
+        except Exception:
+            # Keep the last good value; fresh() stops serving it once stale.
+            # Log only the first failure of a streak, not every interval.
+            if not failing:
+                log.exception("Refreshing %s failed; retrying every %ss", name, interval)
+            failing = True
+        await asyncio.sleep(interval)
+
+def fresh(name: str):
+    """app.state.<name> if its last refresh succeeded recently, else None."""
+    refreshed_at = app.state.refreshed_at.get(name)
+    if refreshed_at is None or time.monotonic() - refreshed_at > VIEW_CACHE_TTL:
+        return None
+    return getattr(app.state, name)
+
+async def fetch_stats() -> tuple:
+    """Uncached PawnShop.stats() read."""
+    (stats,) = await fetch_views([encode_call(app.state.pawn_shop, STATS)])
+    return stats
+
+@app.on_event("startup")
+async def startup():
+    global http_client
+    http_client = httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS, http2=_HTTP2_AVAILABLE
+    )
+
+    app.state.pawn_shop = (
+        w3.eth.contract(address=PAWN_SHOP_ADDRESS, abi=PAWN_SHOP_ABI)
+        if PAWN_SHOP_ADDRESS else None
+    )
+    app.state.recycle_token = (
+        w3.eth.contract(address=RECYCLE_TOKEN_ADDRESS, abi=ERC20_ABI)
+        if RECYCLE_TOKEN_ADDRESS else None
+    )
+
+    # Stats change once per block and fees not much faster; poll both, but
+    # only when there is a contract to read from and send to
+    app.state.stats = None
+    app.state.fees = None
+    app.state.refreshed_at = {}
+    app.state.refreshers = []
+    if app.state.pawn_shop is not None:
+        app.state.refreshers += [
+            asyncio.create_task(keep_fresh("fees", fetch_fees, FEES_REFRESH_INTERVAL)),
+            asyncio.create_task(keep_fresh("stats", fetch_stats, STATS_REFRESH_INTERVAL)),
+        ]
+
+    await run_in_threadpool(warm_up_quality)
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in app.state.refreshers:
+        task.cancel()
+    await http_client.aclose()
+
 @app.get("/")
 async def root():
     return {
@@ -293,10 +905,10 @@ async def root():
 @app.post("/api/evaluate")
 async def evaluate(code: str, language: str = "python"):
     """Preview what code would be worth (no blockchain interaction)."""
-    quality = estimate_quality(code)
+    code_hash, quality = await run_in_threadpool(digest_and_score, code)
     credits = quality * 10  # Same formula as contract
     price = int(credits * 0.85)
-    code_hash = hash_code(code).hex()
+    code_hash = "0x" + code_hash.hex()
 
     return {
         "code_hash": code_hash,
@@ -307,49 +919,43 @@ async def evaluate(code: str, language: str = "python"):
     }
 
 @app.post("/api/deposit")
-async def deposit(req: DepositRequest):
+async def deposit(req: DepositRequest, request: Request):
     """Deposit code pattern on-chain."""
-    if len(req.code) < 50:
-        raise HTTPException(400, "Code too short (min 50 chars)")
+    if req.private_key:
+        pawn_shop = get_pawn_shop(request)
 
-    # Calculate quality
-    quality = estimate_quality(req.code)
-
-    # Hash code
-    code_hash = hash_code(req.code)
-
-    # Upload to IPFS
-    ipfs_uri = upload_to_ipfs(req.code)
+    # Hash first (the upload cache is keyed by it), then score while the
+    # IPFS upload is in flight
+    code_hash = await run_in_threadpool(digest_code, req.code)
+    ipfs_uri, quality = await asyncio.gather(
+        upload_once(req.code, code_hash),
+        run_in_threadpool(estimate_quality, req.code),
+    )
 
     # If no private key, return unsigned tx data
     if not req.private_key:
         return {
-            "code_hash": code_hash.hex(),
+            "code_hash": "0x" + code_hash.hex(),
             "ipfs_uri": ipfs_uri,
             "quality": quality,
             "estimated_credits": quality * 10,
             "tx_data": {
                 "to": PAWN_SHOP_ADDRESS,
                 "function": "deposit",
-                "args": [code_hash.hex(), ipfs_uri, quality]
+                "args": ["0x" + code_hash.hex(), ipfs_uri, quality]
             },
             "message": "Sign and submit this transaction to deposit"
         }
 
     # Sign and send transaction
-    pawn_shop = get_pawn_shop()
-    tx = pawn_shop.functions.deposit(
-        code_hash,
-        ipfs_uri,
-        quality
-    ).build_transaction({
-        'chainId': CHAIN_ID,
-    })
-
-    tx_hash = sign_and_send(tx, req.private_key)
+    tx_hash = await send_transaction(
+        pawn_shop, DEPOSIT, [code_hash, ipfs_uri, quality], req.private_key,
+        fresh("fees") or await fetch_fees()
+    )
+    invalidate_views(encode_call(pawn_shop, GET_PATTERN, [code_hash]))
 
     return {
-        "code_hash": code_hash.hex(),
+        "code_hash": "0x" + code_hash.hex(),
         "ipfs_uri": ipfs_uri,
         "quality": quality,
         "credits": quality * 10,
@@ -358,25 +964,34 @@ async def deposit(req: DepositRequest):
     }
 
 @app.post("/api/purchase")
-async def purchase(req: PurchaseRequest):
+async def purchase(req: PurchaseRequest, pawn_shop=Depends(get_pawn_shop)):
     """Purchase access to a pattern."""
-    code_hash = bytes.fromhex(req.code_hash.replace("0x", ""))
-
-    pawn_shop = get_pawn_shop()
-
-    # Get pattern info first
-    pattern = pawn_shop.functions.getPattern(code_hash).call()
-    if not pattern[5]:  # active
+    code_hash = parse_code_hash(req.code_hash)
+
+    account = Account.from_key(req.private_key)
+
+    # Pattern, pending nonce and (unless polled recently) fees in one batch
+    target, calldata, output_types = encode_call(pawn_shop, GET_PATTERN, [code_hash])
+    fees = fresh("fees")
+    raw_pattern, pending, *fee_history = await rpc_batch(
+        [eth_call(target, calldata), pending_nonce(account.address)]
+        + ([FEE_HISTORY] if fees is None else [])
+    )
+    pattern = Pattern.from_view(w3.codec.decode(output_types, Web3.to_bytes(hexstr=raw_pattern)))
+    if not pattern.active:
         raise HTTPException(404, "Pattern not found or inactive")
 
-    price = pattern[2]
+    price = pattern.price
 
     # Build and send transaction
-    tx = pawn_shop.functions.purchase(code_hash).build_transaction({
-        'chainId': CHAIN_ID,
-    })
-
-    tx_hash = sign_and_send(tx, req.private_key)
+    tx_hash = await send_transaction(
+        pawn_shop, PURCHASE, [code_hash], req.private_key,
+        fees or parse_fees(fee_history[0]), int(pending, 16)
+    )
+    invalidate_views(
+        encode_call(pawn_shop, GET_PATTERN, [code_hash]),
+        encode_call(pawn_shop, HAS_ACCESS, [account.address, code_hash]),
+    )
 
     return {
         "code_hash": req.code_hash,
@@ -386,22 +1001,23 @@ async def purchase(req: PurchaseRequest):
     }
 
 @app.get("/api/access")
-async def check_access(buyer: str, code_hash: str):
+async def check_access(buyer: str, code_hash: str, pawn_shop=Depends(get_pawn_shop)):
     """Check if buyer has access, return code if yes."""
-    code_hash_bytes = bytes.fromhex(code_hash.replace("0x", ""))
+    code_hash_bytes = parse_code_hash(code_hash)
 
-    pawn_shop = get_pawn_shop()
-    has_access = pawn_shop.functions.hasAccess(buyer, code_hash_bytes).call()
+    (has_access,), pattern = await read_views([
+        encode_call(pawn_shop, HAS_ACCESS, [buyer, code_hash_bytes]),
+        encode_call(pawn_shop, GET_PATTERN, [code_hash_bytes]),
+    ])
 
     if not has_access:
         return {"has_access": False, "code": None}
 
-    # Get IPFS URI and fetch code
-    pattern = pawn_shop.functions.getPattern(code_hash_bytes).call()
-    ipfs_uri = pattern[0]
+    # Fetch code from the IPFS URI
+    ipfs_uri = Pattern.from_view(pattern).ipfs_uri
 
     try:
-        code = fetch_from_ipfs(ipfs_uri)
+        code = await fetch_from_ipfs(ipfs_uri)
     except:
         code = None
 
@@ -412,28 +1028,19 @@ async def check_access(buyer: str, code_hash: str):
     }
 
 @app.get("/api/pattern/{code_hash}")
-async def get_pattern(code_hash: str):
+async def get_pattern(code_hash: str, pawn_shop=Depends(get_pawn_shop)):
     """Get pattern details."""
-    code_hash_bytes = bytes.fromhex(code_hash.replace("0x", ""))
+    code_hash_bytes = parse_code_hash(code_hash)
 
-    pawn_shop = get_pawn_shop()
-    pattern = pawn_shop.functions.getPattern(code_hash_bytes).call()
+    (pattern,) = await read_views([encode_call(pawn_shop, GET_PATTERN, [code_hash_bytes])])
 
-    return {
-        "code_hash": code_hash,
-        "ipfs_uri": pattern[0],
-        "seller": pattern[1],
-        "price": pattern[2],
-        "quality": pattern[3],
-        "times_sold": pattern[4],
-        "active": pattern[5]
-    }
+    return {"code_hash": code_hash} | Pattern.from_view(pattern)._asdict()
 
-@app.get("/api/balance/{address}")
-async def get_balance(address: str):
+# Wei balances overflow orjson's 64-bit integers, so use the stdlib encoder
+@app.get("/api/balance/{address}", response_class=JSONResponse)
+async def get_balance(address: str, token=Depends(get_recycle_token)):
     """Get $RECYCLE balance."""
-    token = get_recycle_token()
-    balance = token.functions.balanceOf(address).call()
+    ((balance,),) = await read_views([encode_call(token, BALANCE_OF, [address])])
 
     return {
         "address": address,
@@ -442,10 +1049,11 @@ async def get_balance(address: str):
     }
 
 @app.get("/api/stats")
-async def get_stats():
+async def get_stats(pawn_shop=Depends(get_pawn_shop)):
     """Get marketplace statistics."""
-    pawn_shop = get_pawn_shop()
-    stats = pawn_shop.functions.stats().call()
+    stats = fresh("stats")
+    if stats is None:  # no recent refresh (just started, or RPC failing)
+        (stats,) = await read_views([encode_call(pawn_shop, STATS)])
 
     return {
         "total_patterns": stats[0],
@@ -462,4 +1070,10 @@ async def get_stats():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8005)
+    uvicorn.run(
+        "main:app",
+        app_dir=str(Path(__file__).parent),
+        host="0.0.0.0",
+        port=8005,
+        workers=WEB_CONCURRENCY
+    )
@@ -0,0 +1,582 @@
+"""Tests for main.py. The RPC node, IPFS gateways and Pinata are faked, so
+nothing here touches the network.
+
+Run: cd api && python -m pytest -q
+"""
+
+import asyncio
+import json
+import random
+import time
+from types import SimpleNamespace
+
+import httpx
+import orjson
+import pytest
+from eth_account import Account
+from eth_hash.auto import keccak
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from web3 import Web3
+
+import main
+
+# =============================================================================
+# QUALITY SCORING
+# =============================================================================
+
+def baseline_estimate_quality(code: str) -> int:
+    """The original scorer, kept verbatim as the reference."""
+    scores = []
+
+    lines = code.count('\n') + 1
+    if 10 <= lines <= 500:
+        scores.append(100)
+    elif lines < 10:
+        scores.append(50)
+    else:
+        scores.append(70)
+
+    if "def " in code or "class " in code or "function " in code:
+        scores.append(100)
+    else:
+        scores.append(60)
+
+    if "#" in code or "//" in code or '"""' in code:
+        scores.append(90)
+    else:
+        scores.append(70)
+
+    long_lines = sum(1 for line in code.split('\n') if len(line) > 120)
+    if long_lines == 0:
+        scores.append(100)
+    elif long_lines < 5:
+        scores.append(80)
+    else:
+        scores.append(50)
+
+    avg = sum(scores) / len(scores)
+    return max(10, min(100, int(avg)))
+
+PATTERNS = ["def ", "class ", "function ", "#", "//", '"""']
+
+@pytest.fixture(params=["numba", "python"])
+def scan_path(request, monkeypatch):
+    """Run a test against both the numba kernel and the pure-Python fallback."""
+    if request.param == "numba" and not main._NUMBA_AVAILABLE:
+        pytest.skip("numba not installed")
+    if request.param == "python":
+        monkeypatch.setattr(main, "_NUMBA_AVAILABLE", False)
+    return request.param
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, main.SCAN_CHUNK_SIZE])
+def test_random_code_matches_baseline(scan_path, chunk_size, monkeypatch):
+    monkeypatch.setattr(main, "SCAN_CHUNK_SIZE", chunk_size)
+    rng = random.Random(8004)
+    alphabet = ["a", "é", "😀", "\n", " ", "d", "e", "f", "c", "l", "s", "#", "/", '"', "x" * 130]
+    alphabet += PATTERNS
+    for _ in range(2000):
+        code = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        assert main.estimate_quality(code) == baseline_estimate_quality(code), repr(code)
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_pattern_across_chunk_boundary(scan_path, pattern):
+    for split in range(1, len(pattern)):
+        code = "x" * (main.SCAN_CHUNK_SIZE - split) + pattern + "\ny"
+        assert main.estimate_quality(code) == baseline_estimate_quality(code)
+
+@pytest.mark.parametrize("filler", ["x", "é", "😀"])
+def test_long_line_across_chunk_boundary(scan_path, filler):
+    for line_len in (120, 121, 200):
+        for offset in (1, 60, 119, 120):
+            start = main.SCAN_CHUNK_SIZE - offset
+            code = "a\n" * (start // 2) + "b" * (start % 2) + filler * line_len + "\nend"
+            assert main.estimate_quality(code) == baseline_estimate_quality(code)
+
+def test_digest_code_is_keccak_of_utf8(monkeypatch):
+    monkeypatch.setattr(main, "SCAN_CHUNK_SIZE", 5)
+    code = "def f():\n    return 'é😀'\n" * 3
+    assert main.digest_code(code) == keccak(code.encode("utf-8"))
+
+def test_digest_and_score_is_one_pass_of_both(scan_path, monkeypatch):
+    monkeypatch.setattr(main, "SCAN_CHUNK_SIZE", 5)
+    code = "def f():\n    return 'é😀'  # x\n" * 3
+    assert main.digest_and_score(code) == (
+        keccak(code.encode("utf-8")), baseline_estimate_quality(code)
+    )
+
+# =============================================================================
+# parse_code_hash
+# =============================================================================
+
+@pytest.mark.parametrize("prefix", ["", "0x", "0X"])
+def test_parse_code_hash_accepts_32_bytes(prefix):
+    assert main.parse_code_hash(prefix + "ab" * 32) == bytes.fromhex("ab" * 32)
+
+@pytest.mark.parametrize("value", [
+    "",
+    "0x",
+    "ab" * 31,
+    "ab" * 33,
+    "zz" * 32,
+    "ab" * 31 + "  ",  # fromhex would skip the spaces and return 31 bytes
+    "ab" * 30 + " ab ",
+])
+def test_parse_code_hash_rejects_bad_input(value):
+    with pytest.raises(HTTPException) as exc:
+        main.parse_code_hash(value)
+    assert exc.value.status_code == 400
+
+# =============================================================================
+# NonceManager
+# =============================================================================
+
+ADDRESS = "0x0000000000000000000000000000000000008004"
+
+def fake_pending(monkeypatch, counts: list):
+    """Make eth_getTransactionCount return counts in turn (the last repeats)."""
+    calls = []
+
+    async def rpc_batch(batch):
+        calls.append(batch)
+        return [hex(counts[min(len(calls), len(counts)) - 1])]
+
+    monkeypatch.setattr(main, "rpc_batch", rpc_batch)
+    return calls
+
+def test_nonce_counts_up_while_pending_lags(monkeypatch):
+    calls = fake_pending(monkeypatch, [5])
+    manager = main.NonceManager()
+
+    async def run():
+        return [await manager.next(ADDRESS) for _ in range(3)]
+
+    assert asyncio.run(run()) == [5, 6, 7]
+    assert len(calls) == 3  # pending is read on every send
+
+def test_nonce_follows_chain_when_other_workers_send(monkeypatch):
+    fake_pending(monkeypatch, [5, 9])
+    manager = main.NonceManager()
+
+    async def run():
+        return [await manager.next(ADDRESS) for _ in range(2)]
+
+    assert asyncio.run(run()) == [5, 9]
+
+def test_nonce_reset_resyncs_with_chain(monkeypatch):
+    fake_pending(monkeypatch, [5, 5, 5])
+    manager = main.NonceManager()
+
+    async def run():
+        first = await manager.next(ADDRESS)
+        await manager.next(ADDRESS)
+        await manager.reset(ADDRESS)
+        return first, await manager.next(ADDRESS)
+
+    assert asyncio.run(run()) == (5, 5)
+
+def test_nonce_counters_are_bounded():
+    assert isinstance(main.NonceManager()._nonces, main.TTLCache)
+
+@pytest.mark.parametrize("error", [
+    "nonce too low",
+    "replacement transaction underpriced",
+])
+def test_send_transaction_retries_taken_nonce(monkeypatch, error):
+    fake_pending(monkeypatch, [3, 4])
+    monkeypatch.setattr(main, "nonce_manager", main.NonceManager())
+    sent = []
+
+    async def sign_and_send(tx, private_key):
+        sent.append(tx["nonce"])
+        if len(sent) == 1:
+            raise HTTPException(502, f"RPC error: {{'message': '{error}'}}")
+        return "0xtx"
+
+    monkeypatch.setattr(main, "sign_and_send", sign_and_send)
+    contract = SimpleNamespace(address=ADDRESS)
+    key = Account.create().key.hex()
+
+    tx_hash = asyncio.run(main.send_transaction(contract, main.PURCHASE, [b"\x00" * 32], key, (2, 1)))
+    assert tx_hash == "0xtx"
+    assert sent == [3, 4]
+
+def test_already_known_counts_as_sent(monkeypatch):
+    monkeypatch.setattr(main, "nonce_manager", main.NonceManager())
+    sent = []
+
+    async def rpc_batch(batch):
+        ((method, params),) = batch
+        if method == "eth_getTransactionCount":
+            return ["0x3"]
+        sent.append(params[0])
+        raise HTTPException(502, "RPC error: {'code': -32000, 'message': 'already known'}")
+
+    monkeypatch.setattr(main, "rpc_batch", rpc_batch)
+    contract = SimpleNamespace(address=ADDRESS)
+    key = Account.create().key.hex()
+
+    tx_hash = asyncio.run(main.send_transaction(contract, main.PURCHASE, [b"\x00" * 32], key, (2, 1)))
+    assert len(sent) == 1  # no second broadcast at the next nonce
+    assert tx_hash == "0x" + keccak(bytes.fromhex(sent[0][2:])).hex()
+
+def test_send_transaction_does_not_retry_other_errors(monkeypatch):
+    fake_pending(monkeypatch, [3])
+    monkeypatch.setattr(main, "nonce_manager", main.NonceManager())
+
+    async def sign_and_send(tx, private_key):
+        raise HTTPException(502, "RPC error: {'message': 'insufficient funds'}")
+
+    monkeypatch.setattr(main, "sign_and_send", sign_and_send)
+    contract = SimpleNamespace(address=ADDRESS)
+    key = Account.create().key.hex()
+
+    with pytest.raises(HTTPException):
+        asyncio.run(main.send_transaction(contract, main.PURCHASE, [b"\x00" * 32], key, (2, 1)))
+
+# =============================================================================
+# rpc_batch
+# =============================================================================
+
+def mock_rpc(monkeypatch, handler):
+    """Route http_client through handler(request) -> httpx.Response."""
+    monkeypatch.setattr(
+        main, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+
+def test_rpc_batch_orders_results_by_id(monkeypatch):
+    def handler(request):
+        batch = orjson.loads(request.content)
+        return httpx.Response(200, json=[{"id": c["id"], "result": c["method"]} for c in reversed(batch)])
+
+    mock_rpc(monkeypatch, handler)
+    calls = [("eth_chainId", []), ("eth_blockNumber", [])]
+    assert asyncio.run(main.rpc_batch(calls)) == ["eth_chainId", "eth_blockNumber"]
+
+@pytest.mark.parametrize("response", [
+    httpx.Response(200, json={"jsonrpc": "2.0", "id": None, "error": {"message": "batch not supported"}}),
+    httpx.Response(200, json=[{"id": 0, "error": {"message": "execution reverted"}}]),
+    httpx.Response(200, text="<html>bad gateway</html>"),
+    httpx.Response(503, text="unavailable"),
+])
+def test_rpc_batch_errors_are_502(monkeypatch, response):
+    mock_rpc(monkeypatch, lambda request: response)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(main.rpc_batch([("eth_chainId", [])]))
+    assert exc.value.status_code == 502
+
+# =============================================================================
+# API (TestClient against a fake node standing in for rpc_batch)
+# =============================================================================
+
+PAWN_SHOP = Web3.to_checksum_address("0x" + "11" * 20)
+SELLER = "0xABcdEFABcdEFabcdEfAbCdefabcdeFABcDEFabCD"
+CODE_HASH = "0x" + "ab" * 32
+
+class FakeNode:
+    """Answers rpc_batch calls: eth_call from a table of view results
+    (unwrapping Multicall3 aggregate3), plus nonce, fees and sends."""
+
+    def __init__(self, pending: int = 7):
+        self.views = {}
+        self.pending = pending
+        self.batches = []
+        self.call_targets = []
+
+    def set_view(self, contract, fn: tuple, args: list, result: list):
+        target, calldata, output_types = main.encode_call(contract, fn, args)
+        self.views[(target, calldata)] = main.w3.codec.encode(output_types, result)
+
+    async def __call__(self, calls: list) -> list:
+        self.batches.append([method for method, _ in calls])
+        await asyncio.sleep(0)  # yield like a real round-trip would
+        return [self.answer(method, params) for method, params in calls]
+
+    def answer(self, method: str, params: list):
+        if method == "eth_call":
+            call, _ = params
+            self.call_targets.append(call["to"])
+            if call["to"] != main.MULTICALL3_ADDRESS:
+                return "0x" + self.views[(call["to"], call["data"])].hex()
+            data = bytes.fromhex(call["data"][2:])
+            assert data[:4] == main.AGGREGATE3_SELECTOR
+            (subcalls,) = main.w3.codec.decode(["(address,bool,bytes)[]"], data[4:])
+            results = [
+                (True, self.views[(target, "0x" + calldata.hex())])
+                for target, _, calldata in subcalls
+            ]
+            return "0x" + main.w3.codec.encode(["(bool,bytes)[]"], [results]).hex()
+        if method == "eth_getTransactionCount":
+            return hex(self.pending)
+        if method == "eth_feeHistory":
+            return {"baseFeePerGas": ["0x1", "0x2"], "reward": [["0x3"]]}
+        if method == "eth_sendRawTransaction":
+            return "0x" + keccak(bytes.fromhex(params[0][2:])).hex()
+        raise AssertionError(f"unexpected RPC {method}")
+
+@pytest.fixture
+def node(monkeypatch):
+    node = FakeNode()
+    monkeypatch.setattr(main, "rpc_batch", node)
+    monkeypatch.setattr(main, "nonce_manager", main.NonceManager())
+    main.view_cache.clear()
+    return node
+
+@pytest.fixture
+def pawn_shop():
+    return main.w3.eth.contract(address=PAWN_SHOP, abi=main.PAWN_SHOP_ABI)
+
+@pytest.fixture
+def client(node, pawn_shop):
+    """TestClient with the PawnShop contract configured after startup."""
+    with TestClient(main.app) as client:
+        main.app.state.pawn_shop = pawn_shop
+        yield client
+
+def set_pattern(node, pawn_shop, active=True):
+    node.set_view(pawn_shop, main.GET_PATTERN, [bytes.fromhex(CODE_HASH[2:])],
+                  ["ipfs://QmCode", SELLER.lower(), 850, 100, 2, active])
+
+def test_purchase_reads_pattern_nonce_and_fees_in_one_batch(client, node, pawn_shop):
+    set_pattern(node, pawn_shop)
+    key = Account.create().key.hex()
+
+    r = client.post("/api/purchase", json={"code_hash": CODE_HASH, "private_key": key})
+    assert r.status_code == 200, r.text
+    assert r.json()["price"] == 850
+    assert node.batches == [
+        ["eth_call", "eth_getTransactionCount", "eth_feeHistory"],
+        ["eth_sendRawTransaction"],
+    ]
+
+def test_purchase_of_inactive_pattern_is_404(client, node, pawn_shop):
+    set_pattern(node, pawn_shop, active=False)
+    key = Account.create().key.hex()
+
+    r = client.post("/api/purchase", json={"code_hash": CODE_HASH, "private_key": key})
+    assert r.status_code == 404
+    assert node.batches == [["eth_call", "eth_getTransactionCount", "eth_feeHistory"]]
+
+class StopRefresh(BaseException):
+    """Ends a keep_fresh loop from inside fetch (Exceptions are swallowed)."""
+
+def test_keep_fresh_logs_first_failure_of_each_streak(monkeypatch, caplog):
+    outcomes = iter(["fail", "fail", 1, "fail", "fail", 2])
+
+    async def fetch():
+        outcome = next(outcomes, None)
+        if outcome is None:
+            raise StopRefresh
+        if outcome == "fail":
+            raise RuntimeError("rpc down")
+        return outcome
+
+    monkeypatch.setattr(main.app.state, "refreshed_at", {}, raising=False)
+    monkeypatch.setattr(main.app.state, "probe", None, raising=False)
+    with caplog.at_level("INFO", logger="uvicorn.error"), pytest.raises(StopRefresh):
+        asyncio.run(main.keep_fresh("probe", fetch, 0))
+
+    messages = [r.getMessage() for r in caplog.records]
+    assert messages == [
+        "Refreshing probe failed; retrying every 0s",
+        "Refreshing probe recovered",
+        "Refreshing probe failed; retrying every 0s",
+        "Refreshing probe recovered",
+    ]
+    assert main.app.state.probe == 2
+
+def test_stats_skips_a_stale_refresh(client, node, pawn_shop):
+    node.set_view(pawn_shop, main.STATS, [], [3, 5, 250, 500])
+    main.app.state.stats = (1, 1, 1, 1)
+
+    main.app.state.refreshed_at["stats"] = time.monotonic()
+    assert client.get("/api/stats").json()["total_patterns"] == 1
+    assert node.batches == []
+
+    main.app.state.refreshed_at["stats"] = time.monotonic() - main.VIEW_CACHE_TTL - 1
+    assert client.get("/api/stats").json()["total_patterns"] == 3
+
+BUYER = Web3.to_checksum_address("0x" + "22" * 20)
+
+def test_fetch_views_sends_a_single_call_directly(node, pawn_shop):
+    node.set_view(pawn_shop, main.STATS, [], [3, 5, 250, 500])
+
+    result = asyncio.run(main.fetch_views([main.encode_call(pawn_shop, main.STATS)]))
+    assert result == [(3, 5, 250, 500)]
+    assert node.call_targets == [PAWN_SHOP]
+
+def test_fetch_views_batches_through_multicall3(node, pawn_shop):
+    code_hash = bytes.fromhex(CODE_HASH[2:])
+    set_pattern(node, pawn_shop)
+    node.set_view(pawn_shop, main.HAS_ACCESS, [BUYER, code_hash], [True])
+    node.set_view(pawn_shop, main.STATS, [], [3, 5, 250, 500])
+
+    result = asyncio.run(main.fetch_views([
+        main.encode_call(pawn_shop, main.HAS_ACCESS, [BUYER, code_hash]),
+        main.encode_call(pawn_shop, main.GET_PATTERN, [code_hash]),
+        main.encode_call(pawn_shop, main.STATS),
+    ]))
+    assert result == [
+        (True,),
+        ("ipfs://QmCode", SELLER.lower(), 850, 100, 2, True),
+        (3, 5, 250, 500),
+    ]
+    assert node.call_targets == [main.MULTICALL3_ADDRESS]
+    assert node.batches == [["eth_call"]]
+
+def test_access_without_access_reads_both_views_in_one_call(client, node, pawn_shop):
+    code_hash = bytes.fromhex(CODE_HASH[2:])
+    set_pattern(node, pawn_shop)
+    node.set_view(pawn_shop, main.HAS_ACCESS, [BUYER, code_hash], [False])
+
+    r = client.get("/api/access", params={"buyer": BUYER, "code_hash": CODE_HASH})
+    assert r.json() == {"has_access": False, "code": None}
+    assert node.call_targets == [main.MULTICALL3_ADDRESS]
+
+def test_read_views_serves_hits_and_batches_only_misses(node, pawn_shop):
+    code_hash = bytes.fromhex(CODE_HASH[2:])
+    set_pattern(node, pawn_shop)
+    node.set_view(pawn_shop, main.STATS, [], [3, 5, 250, 500])
+    stats = main.encode_call(pawn_shop, main.STATS)
+    pattern = main.encode_call(pawn_shop, main.GET_PATTERN, [code_hash])
+
+    asyncio.run(main.read_views([stats]))
+    assert node.call_targets == [PAWN_SHOP]
+
+    # stats is cached, so only getPattern goes out (directly, not via Multicall3)
+    result = asyncio.run(main.read_views([stats, pattern]))
+    assert result[0] == (3, 5, 250, 500)
+    assert result[1][2] == 850
+    assert node.call_targets == [PAWN_SHOP, PAWN_SHOP]
+
+    asyncio.run(main.read_views([stats, pattern]))
+    assert len(node.call_targets) == 2
+
+def test_invalidate_views_forces_a_fresh_read(node, pawn_shop):
+    node.set_view(pawn_shop, main.STATS, [], [3, 5, 250, 500])
+    stats = main.encode_call(pawn_shop, main.STATS)
+    asyncio.run(main.read_views([stats]))
+
+    node.set_view(pawn_shop, main.STATS, [], [4, 5, 250, 500])
+    assert asyncio.run(main.read_views([stats])) == [(3, 5, 250, 500)]
+
+    main.invalidate_views(stats)
+    assert asyncio.run(main.read_views([stats])) == [(4, 5, 250, 500)]
+    assert len(node.call_targets) == 2
+
+def test_concurrent_misses_fetch_once(node, pawn_shop):
+    node.set_view(pawn_shop, main.STATS, [], [3, 5, 250, 500])
+    stats = main.encode_call(pawn_shop, main.STATS)
+
+    async def run():
+        return await asyncio.gather(*(main.read_views([stats]) for _ in range(5)))
+
+    assert asyncio.run(run()) == [[(3, 5, 250, 500)]] * 5
+    assert len(node.call_targets) == 1
+
+# =============================================================================
+# IPFS gateway race
+# =============================================================================
+
+GATEWAYS = ["https://slow/ipfs/", "https://broken/ipfs/", "https://fast/ipfs/"]
+
+@pytest.fixture
+def gateways(monkeypatch):
+    """Fake fetch_from_single_gateway; records calls and cancellations."""
+    monkeypatch.setattr(main, "IPFS_GATEWAYS", GATEWAYS)
+    main.ipfs_gateway_cache.clear()
+    log = SimpleNamespace(calls=[], cancelled=[], delays={
+        "https://slow/ipfs/": 5, "https://broken/ipfs/": None, "https://fast/ipfs/": 0.01,
+    })
+
+    async def fetch(gateway, ipfs_hash):
+        log.calls.append(gateway)
+        delay = log.delays[gateway]
+        if delay is None:
+            raise HTTPException(404, "IPFS content not found")
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log.cancelled.append(gateway)
+            raise
+        return f"code from {gateway}"
+
+    monkeypatch.setattr(main, "fetch_from_single_gateway", fetch)
+    return log
+
+def test_gateway_race_takes_first_success_and_cancels_the_rest(gateways):
+    async def run():
+        code = await main.fetch_from_gateway("QmRace")
+        await asyncio.sleep(0)  # let the cancellation land
+        return code, list(gateways.cancelled)  # before asyncio.run cancels leftovers
+
+    assert asyncio.run(run()) == ("code from https://fast/ipfs/", ["https://slow/ipfs/"])
+    assert main.ipfs_gateway_cache["QmRace"] == "https://fast/ipfs/"
+
+def test_gateway_race_tries_last_winner_first(gateways):
+    asyncio.run(main.fetch_from_gateway("QmRace"))
+    gateways.calls.clear()
+
+    assert asyncio.run(main.fetch_from_gateway("QmRace")) == "code from https://fast/ipfs/"
+    assert gateways.calls == ["https://fast/ipfs/"]
+
+def test_gateway_race_falls_back_when_last_winner_fails(gateways):
+    asyncio.run(main.fetch_from_gateway("QmRace"))
+    gateways.delays["https://fast/ipfs/"] = None
+    gateways.delays["https://slow/ipfs/"] = 0.01
+
+    assert asyncio.run(main.fetch_from_gateway("QmRace")) == "code from https://slow/ipfs/"
+    assert main.ipfs_gateway_cache["QmRace"] == "https://slow/ipfs/"
+
+def test_gateway_race_404s_when_every_gateway_fails(gateways):
+    gateways.delays = dict.fromkeys(GATEWAYS)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(main.fetch_from_gateway("QmMissing"))
+    assert exc.value.status_code == 404
+
+# =============================================================================
+# Request size limits
+# =============================================================================
+
+def test_oversized_body_is_413_before_parsing(client):
+    r = client.post(
+        "/api/deposit",
+        content=b" " * (main.MAX_BODY_BYTES + 1),
+        headers={"content-type": "application/json"},
+    )
+    assert r.status_code == 413
+
+def test_max_length_escaped_non_ascii_code_fits(client):
+    code = "def f():  # " + "😀" * (main.MAX_CODE_LENGTH - 12)
+    body = json.dumps({"code": code}).encode()  # ensure_ascii: surrogate-pair escapes
+    assert len(body) <= main.MAX_BODY_BYTES
+
+    r = client.post("/api/deposit", content=body, headers={"content-type": "application/json"})
+    assert r.status_code == 200, r.text[:200]
+
+def test_code_over_model_limit_is_422(client):
+    r = client.post("/api/deposit", json={"code": "x" * (main.MAX_CODE_LENGTH + 1)})
+    assert r.status_code == 422
+
+# =============================================================================
+# Pattern
+# =============================================================================
+
+def test_pattern_from_view_checksums_the_seller():
+    pattern = main.Pattern.from_view(("ipfs://QmCode", SELLER.lower(), 850, 100, 2, True))
+    assert pattern.seller == SELLER
+    assert pattern == ("ipfs://QmCode", SELLER, 850, 100, 2, True)
+
+def test_pattern_endpoint_returns_checksummed_seller(client, node, pawn_shop):
+    set_pattern(node, pawn_shop)
+
+    r = client.get(f"/api/pattern/{CODE_HASH}")
+    assert r.json() == {
+        "code_hash": CODE_HASH,
+        "ipfs_uri": "ipfs://QmCode",
+        "seller": SELLER,
+        "price": 850,
+        "quality": 100,
+        "times_sold": 2,
+        "active": True,
+    }